@@ -1,4 +1,4 @@
-from flask import Flask, request
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import random
@@ -7,9 +7,27 @@ import threading
 import time
 import json
 import os
+import logging
+import queue
+import sqlite3
+import atexit
+import gzip
+import hashlib
+import hmac
+import signal
+import sys
+import functools
+import inspect
+from contextlib import contextmanager
+from collections import deque
 import bcrypt
 from dotenv import load_dotenv
 
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only
+
 # load_dotenv()
 load_dotenv("/etc/secrets/.env")
 HOST_PASSWORD_HASH = os.getenv("HOST_PASSWORD_HASH")
@@ -61,13 +79,68 @@ WORDS_FILE = "words.json"
 RESET_THRESHOLD = 200
 
 MINIMUM_PLAYERS=3
+MAX_PLAYERS = 200
 DEFAULT_DURATION=3
 MAX_DURATION=5
 DISCONNECT_GRACE_SECONDS = 5
+# Engine.IO's server-driven ping/pong finds dead sockets and fires disconnect.
+# The client answers pings as they arrive, so throttled timers in hidden tabs
+# don't cause false disconnects the way a client-side heartbeat timer would.
+PING_INTERVAL_SECONDS = 25
+PING_TIMEOUT_SECONDS = 20
+PRESENCE_TICK_SECONDS = 1       # presence changes are broadcast at most once per tick
+TIE_RULES = ("random", "all", "none")  # vote tie: pick one at random | vote out all | nobody
+STATE_EMIT_INTERVAL = 0.2  # vote progress broadcasts are coalesced over this window
+BROADCAST_DEDUPE_SECONDS = 0.1  # an identical broadcast within this window is dropped
+ROLE_ROOMS = {"crew": "role:crew", "impostor": "role:impostor"}  # Socket.IO rooms per role
+CHAT_ROOM = "chat"  # Socket.IO room of joined players; spectators and the queue don't get chat
+
+CHAT_HISTORY_SIZE = 50          # messages kept per room and sent to new joiners
+CHAT_BATCH_SECONDS = 0.2        # messages sent within this window go out together
+CHAT_RATE_LIMIT = 5             # messages allowed per sender per window
+CHAT_RATE_WINDOW_SECONDS = 10
+CHAT_MAX_LENGTH = 200
+
+# Quick play rooms are opened and run by the server, without a host
+QUICK_PLAY_ROOM_SIZE = max(MINIMUM_PLAYERS, min(MAX_PLAYERS, int(os.getenv("QUICK_PLAY_ROOM_SIZE", 6))))
+QUICK_PLAY_LOBBY_SECONDS = 15     # start with fewer than a full room after this long
+QUICK_PLAY_VOTING_SECONDS = 60    # votes still missing after this long are skipped
+QUICK_PLAY_RESULTS_SECONDS = 10   # how long results stay up before the next round
+MATCHMAKER_TICK_SECONDS = 0.25
+QUEUE_WAIT_SAMPLES = 1000         # recent wait times kept for percentiles
+
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+HISTORY_BATCH_SIZE = 200          # rounds committed per transaction at most
+HISTORY_FLUSH_SECONDS = 1.0       # longest a finished round waits before commit
+HISTORY_WRITE_ATTEMPTS = 3        # tries per batch before its rounds are dropped
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+ASSET_MAX_AGE = 365 * 24 * 60 * 60  # hashed asset names change with their content
+SCRIPT_TAG_MARKER = b'src="app.js"'  # the tag in index.html that build_static points at the hashed asset
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # operator endpoints are disabled without it
+MIGRATION_FILE = os.getenv("MIGRATION_FILE", "migration.json")
+MIGRATION_TARGET_URL = os.getenv("MIGRATION_TARGET_URL")  # where clients reconnect; None = same URL
+DRAIN_TIMEOUT_SECONDS = 120     # how long an active round may run before it is migrated mid-round
+RECONNECT_SPREAD_SECONDS = 10   # clients spread their reconnects over this window
+# Only the replacement server should pick up a hand-off at startup; anything else uses /admin/restore
+RESTORE_ON_START = os.getenv("RESTORE_ON_START") == "1"
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_SECONDS = 0.005
+PROFILE_MAX_SECONDS = 120
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode="threading",
+    ping_interval=PING_INTERVAL_SECONDS,
+    ping_timeout=PING_TIMEOUT_SECONDS
+)
 
 players = {}        # player_id -> {sid, name}
 player_names = {}   # player_id -> name (persists even after player leaves)
@@ -76,16 +149,95 @@ host_sid = None
 state = "waiting"   # waiting | lobby | game | voting | leaderboard
 roles = {}          # player_id -> "impostor" | "crew"
 votes = {}          # voter_pid -> voted_pid
+vote_tally = {}     # voted_pid -> number of votes (kept in step with votes)
 scores = {}         # player_id -> points
 leaderboard = []    # list of {name, score} for display
 current_word = None
 round_end_time = None
+round_started_at = None   # for match history durations
+voting_started_at = None
 timer_thread = None
 # Timer controls
 round_minutes = DEFAULT_DURATION
 round_length_seconds = DEFAULT_DURATION * 60
 timer_paused = False
 paused_remaining = None
+# Large games
+num_impostors = 1
+tie_rule = "random"
+broadcast_roster = {}  # player_id -> name as last broadcast (for roster deltas)
+roster_lock = threading.RLock()  # diff, swap and emit of a roster delta happen as one step
+sid_index = {}      # sid -> player_id lookup cache, validated on read
+state_emit_scheduled = False
+emit_lock = threading.Lock()
+last_broadcasts = {}  # event -> (copy of payload, time sent)
+broadcast_lock = threading.Lock()
+# Presence: deadlines are grouped into per-second buckets so a tick only
+# looks at what is due instead of scanning every player
+grace_buckets = {}      # second -> player_ids whose disconnect grace ends then
+grace_index = {}        # player_id -> its grace bucket
+presence_dirty = False
+presence_lock = threading.Lock()
+# Chat
+chat_history = deque(maxlen=CHAT_HISTORY_SIZE)  # ring buffer of recent messages
+chat_pending = []   # messages waiting for the next batch flush
+chat_send_times = {}  # player_id -> deque of recent send times (rate limit)
+chat_flush_scheduled = False
+chat_lock = threading.Lock()
+# Quick play matchmaking
+quick_play = False  # True while the room is server-hosted quick play
+quick_play_phase = (None, None)  # (state, time it was entered) for auto-advance
+play_queue = deque()  # queued entries in arrival order (cancelled ones skipped lazily)
+queued_sids = {}    # sid -> queue entry
+queue_wait_samples = deque(maxlen=QUEUE_WAIT_SAMPLES)  # seconds spent queued
+players_placed = 0
+matchmaker_running = False
+queue_lock = threading.Lock()
+# Match history (written off-thread)
+history_queue = queue.Queue()
+history_writer_started = False
+history_lock = threading.Lock()
+# Deploys
+draining = False
+drain_lock = threading.Lock()
+# Profiling
+span_stats = {}     # span name -> {count, totalMs, maxMs}
+span_lock = threading.Lock()
+profiler_running = False
+# Frontend, built once at startup
+static_files = {}   # url path -> {contentType, cacheControl, digest, variants: {encoding: bytes}}
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with span_lock:
+            stats = span_stats.get(name)
+            if stats is None:
+                stats = span_stats[name] = {"count": 0, "totalMs": 0.0, "maxMs": 0.0}
+            stats["count"] += 1
+            stats["totalMs"] += elapsed_ms
+            stats["maxMs"] = max(stats["maxMs"], elapsed_ms)
+
+
+def traced(name):
+    # Time every call of the wrapped function under the given span name
+    def decorator(f):
+        max_args = len(inspect.signature(f).parameters)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if len(args) > max_args:
+                # Socket.IO retries handlers without arguments on TypeError; don't time the miss
+                return f(*args, **kwargs)
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 def load_words():
@@ -119,6 +271,7 @@ def remove_word(word):
             json.dump(words, f)
 
 
+@traced("get_random_word")
 def get_random_word():
     words = load_words()
 
@@ -140,9 +293,15 @@ def active_players():
 
 
 def get_player_by_sid(sid):
+    # Cached lookups are checked against players, so stale entries just fall through
+    pid = sid_index.get(sid)
+    if pid is not None and pid in players and players[pid]["sid"] == sid:
+        return pid
     for pid, p in players.items():
         if p["sid"] == sid:
+            sid_index[sid] = pid
             return pid
+    sid_index.pop(sid, None)
     return None
 
 
@@ -151,19 +310,68 @@ def active_player_count():
     return len([p for p in players.values() if p["sid"] is not None])
 
 
+def clear_votes():
+    votes.clear()
+    vote_tally.clear()
+
+
+def rebuild_tally():
+    vote_tally.clear()
+    for voted in votes.values():
+        vote_tally[voted] = vote_tally.get(voted, 0) + 1
+
+
+def impostor_ids():
+    return [pid for pid, role in roles.items() if role == "impostor"]
+
+
 def reset_to_lobby(reason=None):
     # Reset the game to lobby without awarding scores. Broadcast reason if provided.
     global state, roles, votes, current_word
     state = "lobby"
     roles.clear()
-    votes.clear()
+    clear_votes()
     current_word = None
     if reason:
         socketio.emit("game_ended", {"reason": reason})
     request_state_sync()
 
 
-def emit_state():
+def session_open():
+    # A session exists once a host logs in or the matchmaker opens a room
+    return host_token is not None or quick_play
+
+
+def broadcast(event, data):
+    # State is often re-sent unchanged by back-to-back handlers; send it once.
+    # Socket.IO encodes a broadcast once and shares it across recipients, so
+    # compare against a copy of the last payload rather than encoding it here.
+    now = time.monotonic()
+    with broadcast_lock:
+        last = last_broadcasts.get(event)
+        if last and last[0] == data and now - last[1] < BROADCAST_DEDUPE_SECONDS:
+            return False
+        last_broadcasts[event] = (dict(data), now)
+    socketio.emit(event, data)
+    return True
+
+
+def join_role_room(sid, role):
+    socketio.server.enter_room(sid, ROLE_ROOMS[role], namespace="/")
+
+
+def assign_role_rooms():
+    # Fresh rooms every round so each role's message is a single group emit
+    for room in ROLE_ROOMS.values():
+        socketio.server.close_room(room, namespace="/")
+    for pid, role in roles.items():
+        sid = players[pid]["sid"]
+        if sid:
+            join_role_room(sid, role)
+
+
+@traced("emit_state")
+def emit_state(to=None):
     remaining = 0
     time_remaining = None
 
@@ -177,13 +385,16 @@ def emit_state():
 
     emit_data = {
         "state": state,
-        "hostExists": host_token is not None,
+        "hostExists": session_open(),
+        "quickPlay": quick_play,
         "roundMinutes": round_minutes,
         "roundLengthSeconds": round_length_seconds,
         "remainingVotes": remaining,
         "timeRemaining": time_remaining,
         "timerPaused": timer_paused,
         "pausedRemaining": paused_remaining,
+        "impostors": num_impostors,
+        "tieRule": tie_rule,
         "disconnect_time": None
     }
 
@@ -192,49 +403,200 @@ def emit_state():
         emit_data["leaderboard"] = leaderboard
     emit_data["canContinue"] = active_player_count() >= MINIMUM_PLAYERS
 
-    socketio.emit("state_update", emit_data)
+    if to is None:
+        broadcast("state_update", emit_data)
+    else:
+        socketio.emit("state_update", emit_data, to=to)
+
+
+def schedule_state_emit():
+    # Collapse bursts (e.g. 200 votes landing together) into one broadcast
+    global state_emit_scheduled
+    with emit_lock:
+        if state_emit_scheduled:
+            return
+        state_emit_scheduled = True
+    socketio.start_background_task(flush_state_emit)
+
+
+def flush_state_emit():
+    global state_emit_scheduled
+    socketio.sleep(STATE_EMIT_INTERVAL)
+    with emit_lock:
+        state_emit_scheduled = False
+    emit_state()
+
+
+def current_roster():
+    return {
+        pid: p["name"]
+        for pid, p in players.items()
+        if p["sid"] is not None and p["name"] is not None
+    }
 
 
+@traced("emit_players")
 def emit_players():
-    socketio.emit("players_update", {
-        "players": [
-            {
-                "player_id": pid,
-                "name": p["name"]
-            }
-            for pid, p in players.items()
-            if p["sid"] is not None and p["name"] is not None
+    # Broadcast only what changed since the last roster broadcast
+    # Handlers, presence and the matchmaker all call this; deltas built from
+    # the same baseline must not go out interleaved or out of order
+    global broadcast_roster
+    with roster_lock:
+        roster = current_roster()
+        added = [
+            {"player_id": pid, "name": name}
+            for pid, name in roster.items()
+            if broadcast_roster.get(pid) != name
         ]
-    })
+        removed = [pid for pid in broadcast_roster if pid not in roster]
+        broadcast_roster = roster
+        if added or removed:
+            socketio.emit("players_delta", {
+                "added": added,
+                "removed": removed,
+                "total": len(roster)
+            })
 
 
-def enforce_min_players_with_grace():
-    now = time.time()
+@traced("send_players")
+def send_players(sid):
+    # Full roster for one client; later changes reach it as deltas
+    with roster_lock:
+        emit_players()
+        socketio.emit("players_update", {
+            "players": [
+                {"player_id": pid, "name": name}
+                for pid, name in broadcast_roster.items()
+            ]
+        }, to=sid)
+
 
-    # If anyone disconnected recently, wait
-    for p in players.values():
-        if p.get("disconnect_time"):
-            if now - p["disconnect_time"] < DISCONNECT_GRACE_SECONDS:
-                return  # still waiting for possible rejoin
+def in_disconnect_grace():
+    # True if anyone disconnected recently and may still rejoin
+    with presence_lock:
+        return bool(grace_index)
+
+
+def enforce_min_players_with_grace():
+    if in_disconnect_grace():
+        return  # still waiting for possible rejoin
 
     if state in ("game", "voting", "leaderboard"):
         if active_player_count() < MINIMUM_PLAYERS:
             reset_to_lobby("Not enough players - game ended")
 
 
-def start_round_timer():
+def schedule_deadline(buckets, index, pid, when):
+    cancel_deadline(buckets, index, pid)
+    slot = int(when) + 1
+    buckets.setdefault(slot, set()).add(pid)
+    index[pid] = slot
+
+
+def cancel_deadline(buckets, index, pid):
+    slot = index.pop(pid, None)
+    if slot is None:
+        return
+    bucket = buckets.get(slot)
+    if bucket is not None:
+        bucket.discard(pid)
+        if not bucket:
+            del buckets[slot]
+
+
+def pop_due(buckets, index, now):
+    due = []
+    for slot in [slot for slot in buckets if slot <= now]:
+        for pid in buckets.pop(slot):
+            index.pop(pid, None)
+            due.append(pid)
+    return due
+
+
+def mark_seen(pid):
+    # (Re)connect: end any grace period
+    global presence_dirty
+    with presence_lock:
+        if pid in grace_index:
+            cancel_deadline(grace_buckets, grace_index, pid)
+            presence_dirty = True
+
+
+def start_grace(pid, seconds=DISCONNECT_GRACE_SECONDS):
+    global presence_dirty
+    with presence_lock:
+        schedule_deadline(grace_buckets, grace_index, pid, time.time() + seconds)
+        presence_dirty = True
+
+
+def forget_presence(pid):
+    # Player left on purpose: no grace period
+    with presence_lock:
+        cancel_deadline(grace_buckets, grace_index, pid)
+
+
+def presence_changed():
+    global presence_dirty
+    with presence_lock:
+        presence_dirty = True
+
+
+def clear_presence():
+    global presence_dirty
+    with presence_lock:
+        grace_buckets.clear()
+        grace_index.clear()
+        presence_dirty = False
+
+
+def presence_tick():
+    global presence_dirty
+    now = time.time()
+    with presence_lock:
+        expired = pop_due(grace_buckets, grace_index, now)
+        changed = presence_dirty
+        presence_dirty = False
+
+    expired = [pid for pid in expired if pid in players and players[pid]["sid"] is None]
+    if not changed and not expired:
+        return
+
+    # One broadcast per tick, and only if who is here differs from what
+    # clients were last sent (by us or by any handler)
+    with roster_lock:
+        stale = current_roster().keys() != broadcast_roster.keys()
+    if stale:
+        request_state_sync()
+
+    if expired and state not in ("voting", "leaderboard"):
+        enforce_min_players_with_grace()
+
+
+def run_presence():
+    # Started once at import, so a failed tick must not end presence for good
+    while True:
+        socketio.sleep(PRESENCE_TICK_SECONDS)
+        try:
+            presence_tick()
+        except Exception:
+            logger.exception("Presence tick failed")
+
+
+def start_round_timer(duration=None):
     global state, round_end_time
     global timer_paused, paused_remaining
 
-    duration = round_length_seconds
+    # A migrated round resumes with whatever time it had left
+    if duration is None:
+        duration = round_length_seconds
     round_end_time = time.time() + duration
 
     while state == "game":
         if timer_paused:
             # While paused, report pausedRemaining
-            socketio.emit("state_update", {
+            broadcast("state_update", {
                 "state": "game",
-                "hostExists": host_token is not None,
+                "hostExists": session_open(),
                 "roundMinutes": round_minutes,
                 "timeRemaining": paused_remaining,
                 "timerPaused": True,
@@ -246,9 +608,9 @@ def start_round_timer():
         remaining = int(round_end_time - time.time())
         if remaining <= 0:
             break
-        socketio.emit("state_update", {
+        broadcast("state_update", {
             "state": "game",
-            "hostExists": host_token is not None,
+            "hostExists": session_open(),
             "roundMinutes": round_minutes,
             "timeRemaining": remaining,
             "timerPaused": False
@@ -260,37 +622,827 @@ def start_round_timer():
 
 
 def transition_to_voting():
-    global state, votes
-    votes.clear()
+    global state, voting_started_at
+    clear_votes()
     state = "voting"
+    voting_started_at = time.time()
     request_state_sync()
 
 
 def compute_results():
-    # count votes
-    tally = {}
-    for voted in votes.values():
-        tally[voted] = tally.get(voted, 0) + 1
-
+    # vote_tally is kept up to date by cast_vote
+    tally = {pid: n for pid, n in vote_tally.items() if n > 0}
     if not tally:
         return None
 
-    voted_out = max(tally.items(), key=lambda x: x[1])[0]
+    top = max(tally.values())
+    leaders = [pid for pid, n in tally.items() if n == top]
+    if len(leaders) == 1 or tie_rule == "all":
+        voted_out = leaders
+    elif tie_rule == "none":
+        voted_out = []
+    else:
+        voted_out = [random.choice(leaders)]
 
-    impostor_pid = None
-    for pid, role in roles.items():
-        if role == "impostor":
-            impostor_pid = pid
-            break
+    impostors = impostor_ids()
 
     return {
         "votedOut": voted_out,
-        "impostor": impostor_pid,
-        "correct": voted_out == impostor_pid
+        "impostors": impostors,
+        "correct": any(pid in impostors for pid in voted_out)
+    }
+
+
+def is_name_taken(name, pid=None):
+    # Check if name is already taken by another active player
+    for other_pid, player_data in players.items():
+        if other_pid != pid and player_data["name"] == name and player_data["sid"] is not None:
+            return True
+    return False
+
+
+def add_player(sid, name):
+    # Create a brand new player for this connection and tell everyone
+    pid = str(uuid.uuid4())
+    players[pid] = {
+        "sid": sid,
+        "name": name
+    }
+    player_names[pid] = name  # Persist name for this session
+    mark_seen(pid)
+
+    socketio.emit("join_result", {
+        "success": True,
+        "playerId": pid,
+        "state": state,
+        "isHost": False
+    }, to=sid)
+    join_chat(sid)
+
+    # If joining mid-game, force crew role
+    if state == "game":
+        roles[pid] = "crew"
+        join_role_room(sid, "crew")
+        socketio.emit(
+            "role",
+            {"role": "crew", "word": current_word},
+            to=sid
+        )
+
+    # Broadcast join message to all OTHER players
+    socketio.emit("player_joined", {"name": name}, skip_sid=sid)
+    return pid
+
+
+def dequeue(sid):
+    # Cancel a queued quick play entry; the deque skips it when it reaches the front
+    with queue_lock:
+        entry = queued_sids.pop(sid, None)
+        if entry:
+            entry["cancelled"] = True
+    return entry is not None
+
+
+def pop_queued(count):
+    # Take up to count live entries from the front of the queue
+    taken = []
+    with queue_lock:
+        while play_queue and len(taken) < count:
+            entry = play_queue.popleft()
+            if entry["cancelled"]:
+                continue
+            del queued_sids[entry["sid"]]
+            taken.append(entry)
+    return taken
+
+
+def unique_name(name):
+    candidate = name
+    n = 2
+    while is_name_taken(candidate):
+        candidate = f"{name} {n}"
+        n += 1
+    return candidate
+
+
+def place_queued_players():
+    # Fill the quick play room up to its target size, opening it if needed
+    global state, quick_play, players_placed
+
+    if not quick_play and state != "waiting":
+        return  # a hosted session owns this server
+    if draining:
+        return  # a server that is shutting down takes no one from the queue
+    if state == "voting":
+        return  # don't change the roster mid-vote
+
+    open_slots = QUICK_PLAY_ROOM_SIZE - active_player_count()
+    if open_slots <= 0:
+        return
+
+    if not quick_play:
+        # Only open a room once there are enough people to play
+        with queue_lock:
+            if len(queued_sids) < MINIMUM_PLAYERS:
+                return
+
+    entries = pop_queued(open_slots)
+    if not entries:
+        return
+
+    if not quick_play:
+        state = "lobby"
+        quick_play = True
+
+    now = time.time()
+    for entry in entries:
+        queue_wait_samples.append(now - entry["queuedAt"])
+        add_player(entry["sid"], unique_name(entry["name"]))
+    players_placed += len(entries)
+
+    request_state_sync()
+
+
+def advance_quick_play():
+    # Do the host's job for server-hosted rooms
+    global quick_play_phase
+
+    if not quick_play:
+        return
+
+    now = time.time()
+    if quick_play_phase[0] != state:
+        quick_play_phase = (state, now)
+    waited = now - quick_play_phase[1]
+    active = active_player_count()
+
+    if active == 0 and not in_disconnect_grace():
+        close_session()
+    elif state == "lobby":
+        if active >= QUICK_PLAY_ROOM_SIZE or (active >= MINIMUM_PLAYERS and waited >= QUICK_PLAY_LOBBY_SECONDS):
+            begin_round(True)
+    elif state == "voting":
+        if votes and not any(pid not in votes for pid in active_player_ids()):
+            score_round()
+        elif waited >= QUICK_PLAY_VOTING_SECONDS:
+            # No host to wait on an idle voter: count the votes that are in
+            score_round(voting_closed=True)
+            if state == "voting":
+                reset_to_lobby("Round could not be scored")
+    elif state == "leaderboard" and waited >= QUICK_PLAY_RESULTS_SECONDS:
+        if active >= MINIMUM_PLAYERS:
+            begin_round(False)
+        else:
+            reset_to_lobby("Not enough players - waiting for more")
+
+
+def run_matchmaker():
+    global matchmaker_running
+    while True:
+        socketio.sleep(MATCHMAKER_TICK_SECONDS)
+        with queue_lock:
+            if not queued_sids and not quick_play:
+                matchmaker_running = False
+                return
+        # Handlers change players on other threads; a bad tick must not end
+        # matchmaking for good while matchmaker_running stays set
+        try:
+            place_queued_players()
+            advance_quick_play()
+        except Exception:
+            logger.exception("Matchmaker tick failed")
+
+
+def queue_wait_percentiles():
+    samples = sorted(queue_wait_samples)
+    if not samples:
+        return {"p50": None, "p90": None, "p99": None}
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 3)
+
+    return {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99)}
+
+
+@app.route("/matchmaking/stats")
+def matchmaking_stats():
+    with queue_lock:
+        queued = len(queued_sids)
+    return jsonify({
+        "queued": queued,
+        "placed": players_placed,
+        "roomSize": QUICK_PLAY_ROOM_SIZE,
+        "quickPlayActive": quick_play,
+        "waitSeconds": queue_wait_percentiles()
+    })
+
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    word TEXT,
+    impostor_id TEXT,
+    voted_out_id TEXT,
+    correct INTEGER NOT NULL,
+    num_players INTEGER NOT NULL,
+    round_seconds REAL,
+    voting_seconds REAL
+);
+CREATE TABLE IF NOT EXISTS round_players (
+    round_id INTEGER NOT NULL REFERENCES rounds(id),
+    player_id TEXT NOT NULL,
+    name TEXT,
+    role TEXT NOT NULL,
+    voted_for TEXT,
+    points INTEGER NOT NULL,
+    won INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS round_players_player ON round_players(player_id, round_id);
+CREATE INDEX IF NOT EXISTS rounds_word ON rounds(word);
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_id TEXT PRIMARY KEY,
+    name TEXT,
+    rounds INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    impostor_rounds INTEGER NOT NULL,
+    impostor_wins INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS word_stats (
+    word TEXT PRIMARY KEY,
+    rounds INTEGER NOT NULL,
+    crew_votes INTEGER NOT NULL,
+    correct_votes INTEGER NOT NULL
+);
+"""
+
+
+def open_history_db():
+    # Writer connection; the only place the schema is created
+    conn = sqlite3.connect(HISTORY_DB, timeout=10)
+    # WAL lets the stats queries read while the writer commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(HISTORY_SCHEMA)
+    return conn
+
+
+def query_history(sql, params):
+    # Plain read-only connection: no pragmas or DDL on the read path
+    try:
+        conn = sqlite3.connect(f"file:{HISTORY_DB}?mode=ro", uri=True, timeout=10)
+    except sqlite3.OperationalError:
+        return []  # nothing recorded yet
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            return []  # the writer hasn't created the schema yet
+        raise
+    finally:
+        conn.close()
+
+
+def record_round(result, scores_before):
+    # Snapshot the finished round and hand it to the writer thread
+    global history_writer_started
+    now = time.time()
+    impostors = result["impostors"]
+    record = {
+        "finishedAt": now,
+        "word": current_word,
+        "impostors": impostors,
+        "votedOut": result["votedOut"],
+        "correct": result["correct"],
+        "roundSeconds": now - round_started_at if round_started_at else None,
+        "votingSeconds": now - voting_started_at if voting_started_at else None,
+        "players": [
+            {
+                "playerId": pid,
+                "name": player_names.get(pid),
+                "role": role,
+                "votedFor": votes.get(pid),
+                "points": scores.get(pid, 0) - scores_before.get(pid, 0),
+                # Impostors win by surviving the vote, crew by voting for an impostor
+                "won": pid not in result["votedOut"] if role == "impostor" else votes.get(pid) in impostors
+            }
+            for pid, role in roles.items()
+        ]
+    }
+    history_queue.put(record)
+
+    with history_lock:
+        if not history_writer_started:
+            history_writer_started = True
+            threading.Thread(target=run_history_writer, daemon=True).start()
+
+
+def write_round(conn, record):
+    cur = conn.execute(
+        "INSERT INTO rounds (finished_at, word, impostor_id, voted_out_id, correct, num_players, round_seconds, voting_seconds)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (record["finishedAt"], record["word"], ",".join(record["impostors"]), ",".join(record["votedOut"]),
+         int(record["correct"]),
+         len(record["players"]), record["roundSeconds"], record["votingSeconds"])
+    )
+    round_id = cur.lastrowid
+    conn.executemany(
+        "INSERT INTO round_players (round_id, player_id, name, role, voted_for, points, won) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (round_id, p["playerId"], p["name"], p["role"], p["votedFor"], p["points"], int(p["won"]))
+            for p in record["players"]
+        ]
+    )
+    # Keep running totals so stats queries never scan the round tables
+    conn.executemany(
+        "INSERT INTO player_stats (player_id, name, rounds, wins, impostor_rounds, impostor_wins) VALUES (?, ?, 1, ?, ?, ?)"
+        " ON CONFLICT(player_id) DO UPDATE SET name = excluded.name, rounds = rounds + 1, wins = wins + excluded.wins,"
+        " impostor_rounds = impostor_rounds + excluded.impostor_rounds, impostor_wins = impostor_wins + excluded.impostor_wins",
+        [
+            (p["playerId"], p["name"], int(p["won"]), int(p["role"] == "impostor"),
+             int(p["won"] and p["role"] == "impostor"))
+            for p in record["players"]
+        ]
+    )
+    crew_votes = [p["votedFor"] for p in record["players"] if p["role"] != "impostor" and p["votedFor"]]
+    conn.execute(
+        "INSERT INTO word_stats (word, rounds, crew_votes, correct_votes) VALUES (?, 1, ?, ?)"
+        " ON CONFLICT(word) DO UPDATE SET rounds = rounds + 1, crew_votes = crew_votes + excluded.crew_votes,"
+        " correct_votes = correct_votes + excluded.correct_votes",
+        (record["word"], len(crew_votes), len([v for v in crew_votes if v in record["impostors"]]))
+    )
+
+
+def run_history_writer():
+    global history_writer_started
+    conn = None
+    for attempt in range(1, HISTORY_WRITE_ATTEMPTS + 1):
+        try:
+            conn = open_history_db()
+            break
+        except (sqlite3.Error, OSError):
+            if attempt == HISTORY_WRITE_ATTEMPTS:
+                logger.exception("Couldn't open the history database after %d attempts", attempt)
+            else:
+                logger.warning("Opening the history database failed (attempt %d), retrying", attempt, exc_info=True)
+                time.sleep(attempt)
+    if conn is None:
+        # Rounds stay queued; the next finished round starts a fresh writer
+        with history_lock:
+            history_writer_started = False
+        return
+
+    while True:
+        # Block for the first round, then gather whatever else arrives in the window
+        batch = [history_queue.get()]
+        deadline = time.time() + HISTORY_FLUSH_SECONDS
+        while len(batch) < HISTORY_BATCH_SIZE:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(history_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        try:
+            for attempt in range(1, HISTORY_WRITE_ATTEMPTS + 1):
+                try:
+                    with conn:
+                        for record in batch:
+                            write_round(conn, record)
+                    break
+                except sqlite3.Error:
+                    if attempt == HISTORY_WRITE_ATTEMPTS:
+                        logger.exception("Dropping %d rounds after %d failed history writes", len(batch), attempt)
+                    else:
+                        logger.warning("History write failed (attempt %d), retrying", attempt, exc_info=True)
+                        time.sleep(attempt)
+        finally:
+            for _ in batch:
+                history_queue.task_done()
+
+
+@atexit.register
+def flush_history(timeout=5):
+    # Give the writer a moment to commit anything still queued
+    deadline = time.time() + timeout
+    while history_writer_started and history_queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def player_win_rate(player_id):
+    rows = query_history(
+        "SELECT name, rounds, wins, impostor_rounds, impostor_wins FROM player_stats WHERE player_id = ?",
+        (player_id,)
+    )
+
+    if not rows:
+        return None
+    name, rounds, wins, impostor_rounds, impostor_wins = rows[0]
+    return {
+        "playerId": player_id,
+        "name": name,
+        "rounds": rounds,
+        "wins": wins,
+        "winRate": wins / rounds if rounds else None,
+        "impostorRounds": impostor_rounds,
+        "impostorWinRate": impostor_wins / impostor_rounds if impostor_rounds else None
     }
 
 
+def word_difficulty(limit=20, min_rounds=1):
+    # Hardest words first: the smaller the share of crew votes that found the impostor
+    rows = query_history(
+        "SELECT word, rounds, crew_votes, correct_votes FROM word_stats"
+        " WHERE rounds >= ? AND crew_votes > 0"
+        " ORDER BY CAST(correct_votes AS REAL) / crew_votes ASC, rounds DESC LIMIT ?",
+        (min_rounds, limit)
+    )
+
+    return [
+        {
+            "word": word,
+            "rounds": rounds,
+            "crewVotes": crew_votes,
+            "difficulty": 1 - correct_votes / crew_votes
+        }
+        for word, rounds, crew_votes, correct_votes in rows
+    ]
+
+
+@app.route("/stats/players/<player_id>")
+def player_stats(player_id):
+    stats = player_win_rate(player_id)
+    if stats is None:
+        return jsonify({"error": "Unknown player"}), 404
+    return jsonify(stats)
+
+
+@app.route("/stats/words")
+def word_stats():
+    limit = max(1, min(500, request.args.get("limit", 20, type=int)))
+    min_rounds = max(1, request.args.get("minRounds", 1, type=int))
+    return jsonify({"words": word_difficulty(limit, min_rounds)})
+
+
+def build_static_file(body, content_type, cache_control):
+    # Compress once up front so requests only pick a variant
+    variants = {
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0)
+    }
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return {
+        "contentType": content_type,
+        "cacheControl": cache_control,
+        "digest": hashlib.sha256(body).hexdigest()[:16],
+        "variants": variants
+    }
+
+
+def build_static():
+    index_path = os.path.join(FRONTEND_DIR, "index.html")
+    script_path = os.path.join(FRONTEND_DIR, "app.js")
+    if not os.path.exists(index_path) or not os.path.exists(script_path):
+        return  # backend deployed on its own
+
+    with open(script_path, "rb") as f:
+        script = f.read()
+    with open(index_path, "rb") as f:
+        index = f.read()
+
+    # Name the script after its content so it can be cached forever
+    script_url = f"/assets/app.{hashlib.sha256(script).hexdigest()[:12]}.js"
+    static_files.clear()
+    if index.count(SCRIPT_TAG_MARKER) != 1:
+        # Serving the page unrewritten would load a script we have no route for
+        logger.error("%s must contain %s exactly once; not serving the frontend", index_path, SCRIPT_TAG_MARKER.decode())
+        return
+    # Tell the script it was served by the backend, so it connects back to this origin
+    index = index.replace(SCRIPT_TAG_MARKER, f'src="{script_url}" data-backend="self"'.encode())
+
+    static_files[script_url] = build_static_file(
+        script,
+        "application/javascript; charset=utf-8",
+        f"public, max-age={ASSET_MAX_AGE}, immutable"
+    )
+    # The page itself is always revalidated so a deploy picks up the new script name
+    static_files["/"] = build_static_file(index, "text/html; charset=utf-8", "no-cache")
+
+
+def serve_static(path):
+    asset = static_files.get(path)
+    if asset is None:
+        return "Not found", 404
+
+    encoding = request.accept_encodings.best_match(
+        [e for e in ("br", "gzip") if e in asset["variants"]],
+        default="identity"
+    )
+    # Strong ETag per encoded representation
+    etag = f"{asset['digest']}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset["variants"][encoding], content_type=asset["contentType"])
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = asset["cacheControl"]
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+@app.route("/")
+def index():
+    return serve_static("/")
+
+
+@app.route("/assets/<name>")
+def asset(name):
+    return serve_static(f"/assets/{name}")
+
+
+def serialize_game():
+    # Everything a fresh server needs to pick the session up where it left off
+    time_remaining = None
+    if state == "game":
+        if timer_paused:
+            time_remaining = paused_remaining
+        elif round_end_time:
+            time_remaining = max(0, int(round_end_time - time.time()))
+
+    with chat_lock:
+        chat = list(chat_history)
+
+    return {
+        "savedAt": time.time(),
+        "players": {
+            pid: {"name": p["name"], "active": p["sid"] is not None}
+            for pid, p in players.items()
+        },
+        "playerNames": player_names,
+        "hostToken": host_token,
+        "quickPlay": quick_play,
+        "state": state,
+        "roles": roles,
+        "votes": votes,
+        "scores": scores,
+        "leaderboard": leaderboard,
+        "currentWord": current_word,
+        "roundMinutes": round_minutes,
+        "roundLengthSeconds": round_length_seconds,
+        "timeRemaining": time_remaining,
+        "timerPaused": timer_paused,
+        "numImpostors": num_impostors,
+        "tieRule": tie_rule,
+        "roundStartedAt": round_started_at,
+        "votingStartedAt": voting_started_at,
+        "chat": chat
+    }
+
+
+def save_migration():
+    tmp_path = MIGRATION_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(serialize_game(), f)
+    os.replace(tmp_path, MIGRATION_FILE)
+
+
+def restore_migration():
+    # Take over a session handed off by a draining server, if there is one
+    global host_token, quick_play, state, roles, votes, scores, leaderboard, current_word
+    global round_minutes, round_length_seconds, timer_paused, paused_remaining, timer_thread
+    global num_impostors, tie_rule, round_started_at, voting_started_at, matchmaker_running
+
+    if state != "waiting" or not os.path.exists(MIGRATION_FILE):
+        return False
+
+    # Read everything up front so a bad file fails before any state changes
+    try:
+        with open(MIGRATION_FILE) as f:
+            saved = json.load(f)
+        restored_players = {
+            pid: {"sid": None, "name": p["name"]}
+            for pid, p in saved["players"].items()
+        }
+        reconnecting = [pid for pid, p in saved["players"].items() if p["active"]]
+        restored = {key: saved[key] for key in (
+            "playerNames", "hostToken", "quickPlay", "state", "roles", "votes", "scores",
+            "leaderboard", "currentWord", "roundMinutes", "roundLengthSeconds", "timeRemaining",
+            "timerPaused", "numImpostors", "tieRule", "roundStartedAt", "votingStartedAt", "chat"
+        )}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        logger.exception("Could not read %s; leaving it in place", MIGRATION_FILE)
+        return False
+
+    # Everyone has to reconnect; give them the whole reconnect window as grace
+    players.clear()
+    players.update(restored_players)
+    for pid in reconnecting:
+        start_grace(pid, RECONNECT_SPREAD_SECONDS + DISCONNECT_GRACE_SECONDS)
+    player_names.clear()
+    player_names.update(restored["playerNames"])
+
+    host_token = restored["hostToken"]
+    quick_play = restored["quickPlay"]
+    state = restored["state"]
+    roles = restored["roles"]
+    votes.clear()
+    votes.update(restored["votes"])
+    rebuild_tally()
+    scores = restored["scores"]
+    leaderboard = restored["leaderboard"]
+    current_word = restored["currentWord"]
+    round_minutes = restored["roundMinutes"]
+    round_length_seconds = restored["roundLengthSeconds"]
+    num_impostors = restored["numImpostors"]
+    tie_rule = restored["tieRule"]
+    round_started_at = restored["roundStartedAt"]
+    voting_started_at = restored["votingStartedAt"]
+    with chat_lock:
+        chat_history.clear()
+        chat_history.extend(restored["chat"])
+
+    timer_paused = restored["timerPaused"]
+    paused_remaining = restored["timeRemaining"] if timer_paused else None
+    if state == "game":
+        timer_thread = threading.Thread(
+            target=start_round_timer,
+            args=(restored["timeRemaining"] or 0,),
+            daemon=True
+        )
+        timer_thread.start()
+
+    if quick_play:
+        with queue_lock:
+            start_matchmaker = not matchmaker_running
+            matchmaker_running = True
+        if start_matchmaker:
+            socketio.start_background_task(run_matchmaker)
+
+    # Only a completed hand-off consumes the file
+    os.remove(MIGRATION_FILE)
+    return True
+
+
+def begin_drain():
+    # Stop taking new rooms and hand the current one off; safe to call repeatedly
+    global draining
+    with drain_lock:
+        if draining:
+            return
+        draining = True
+    threading.Thread(target=run_drain, daemon=True).start()
+
+
+def run_drain():
+    # Let a round in progress finish rather than migrating it mid-round
+    deadline = time.time() + DRAIN_TIMEOUT_SECONDS
+    while state in ("game", "voting") and time.time() < deadline:
+        time.sleep(1)
+
+    if session_open():
+        # Handlers keep changing the game while we serialize it, and the
+        # migration path may be unwritable; the shutdown has to go on either way
+        try:
+            save_migration()
+        except Exception:
+            logger.exception("Saving the migration failed; the session will not carry over")
+
+    # Clients reconnect at a random point in the window, not all at once
+    socketio.emit("reconnect_hint", {
+        "url": MIGRATION_TARGET_URL,
+        "spreadSeconds": RECONNECT_SPREAD_SECONDS
+    })
+    flush_history()
+    time.sleep(2)  # let the hint go out
+    os._exit(0)
+
+
+def is_admin():
+    token = request.headers.get("X-Admin-Token", "")
+    return ADMIN_TOKEN is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+@app.route("/admin/drain", methods=["POST"])
+def admin_drain():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    begin_drain()
+    return jsonify({"draining": True, "state": state})
+
+
+@app.route("/admin/restore", methods=["POST"])
+def admin_restore():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    restored = restore_migration()
+    if restored:
+        request_state_sync()
+    return jsonify({"restored": restored, "state": state})
+
+
+def run_profiler(seconds, path):
+    # Sample every other thread's stack and write folded stacks (flamegraph.pl / speedscope)
+    global profiler_running
+    counts = {}
+    me = threading.get_ident()
+    deadline = time.time() + seconds
+    try:
+        while time.time() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            time.sleep(PROFILE_INTERVAL_SECONDS)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for key, count in counts.items():
+                f.write(f"{key} {count}\n")
+    finally:
+        profiler_running = False
+
+
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    global profiler_running
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    seconds = max(1, min(PROFILE_MAX_SECONDS, request.args.get("seconds", 10, type=int)))
+    with span_lock:
+        if profiler_running:
+            return jsonify({"error": "Profiler already running"}), 409
+        profiler_running = True
+    path = os.path.join(PROFILE_DIR, f"profile-{int(time.time())}.folded")
+    threading.Thread(target=run_profiler, args=(seconds, path), daemon=True).start()
+    return jsonify({"seconds": seconds, "path": path})
+
+
+@app.route("/admin/spans")
+def admin_spans():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    with span_lock:
+        spans = {
+            name: dict(stats, avgMs=stats["totalMs"] / stats["count"])
+            for name, stats in span_stats.items()
+        }
+    return jsonify({"spans": spans})
+
+
+@traced("send_chat_history")
+def send_chat_history(sid):
+    # Give a (re)joining player the recent chat in one payload
+    with chat_lock:
+        messages = list(chat_history)
+    socketio.emit("chat_history", {"messages": messages}, to=sid)
+
+
+def join_chat(sid):
+    socketio.server.enter_room(sid, CHAT_ROOM, namespace="/")
+    send_chat_history(sid)
+
+
+@traced("flush_chat")
+def flush_chat_batch(batch):
+    socketio.emit("chat_messages", {"messages": batch}, to=CHAT_ROOM)
+
+
+def flush_chat():
+    # Runs once per batch window; everything sent meanwhile goes out as one event.
+    # Chat never touches game state, so it can't hold up votes or the round timer.
+    global chat_flush_scheduled
+    socketio.sleep(CHAT_BATCH_SECONDS)
+    with chat_lock:
+        batch = chat_pending[:]
+        chat_pending.clear()
+        chat_flush_scheduled = False
+    if batch:
+        flush_chat_batch(batch)
+
+
+def clear_chat():
+    with chat_lock:
+        chat_history.clear()
+        chat_pending.clear()
+        chat_send_times.clear()
+    socketio.server.close_room(CHAT_ROOM, namespace="/")
+
+
 @socketio.on("connect")
+@traced("on:connect")
 def connect():
     token = request.args.get("token")
     pid = request.args.get("playerId")
@@ -303,7 +1455,8 @@ def connect():
 
     if pid in players:
         players[pid]["sid"] = request.sid
-        players[pid].pop("disconnect_time", None)
+        mark_seen(pid)
+        presence_changed()
         has_joined = True
     else:
         has_joined = False
@@ -314,41 +1467,39 @@ def connect():
         "playerId": pid
     }, to=request.sid)
 
-    request_state_sync()
+    if has_joined:
+        join_chat(request.sid)
+    # The client asks for its own state sync; everyone else hears on the next presence tick
 
 
 @socketio.on("disconnect")
+@traced("on:disconnect")
 def disconnect():
     # On disconnect (page refresh, network drop), just mark player as disconnected
     # Don't broadcast leave messages or remove them
     # They can rejoin with same playerId
+    dequeue(request.sid)
     pid = get_player_by_sid(request.sid)
+    sid_index.pop(request.sid, None)
     if not pid: return
     players[pid]["sid"] = None
-    players[pid]["disconnect_time"] = time.time()
-    emit_state()
-    # Start a delayed enforcement check after grace period
-    if state in ("voting", "leaderboard"): return
-    def delayed_enforce():
-        time.sleep(DISCONNECT_GRACE_SECONDS)
-        # If player is still disconnected, enforce minimum player rules
-        player = players.get(pid)
-        if player and player.get("sid") is None:
-            enforce_min_players_with_grace()
-            request_state_sync()
-
-    threading.Thread(target=delayed_enforce, daemon=True).start()
+    # Presence broadcasts this on its next tick and enforces the minimum
+    # player count once the grace period runs out
+    start_grace(pid)
 
 
 @socketio.on("host_login")
+@traced("on:host_login")
 def host_login(data):
     global host_token, host_sid, state
 
-    if host_token is not None:
+    if host_token is not None or quick_play or draining:
         socketio.emit("host_login_result", {"success": False}, to=request.sid)
         return
 
-    if not bcrypt.checkpw(data.get("password", "").encode(), HOST_PASSWORD_HASH.encode()):
+    with span("bcrypt"):
+        password_ok = bcrypt.checkpw(data.get("password", "").encode(), HOST_PASSWORD_HASH.encode())
+    if not password_ok:
         socketio.emit("host_login_result", {"success": False}, to=request.sid)
         return
 
@@ -365,6 +1516,7 @@ def host_login(data):
 
 
 @socketio.on("join")
+@traced("on:join")
 def join(data):
     global players
 
@@ -390,11 +1542,12 @@ def join(data):
                 player_names[pid] = new_name
         
         players[pid]["sid"] = request.sid
-        players[pid].pop("disconnect_time", None)
+        mark_seen(pid)
         socketio.emit("join_result", {
             "success": True,
             "playerId": pid
         }, to=request.sid)
+        join_chat(request.sid)
 
         if was_disconnected:
             socketio.emit(
@@ -406,6 +1559,7 @@ def join(data):
         # If joining mid-game, force crew role
         if state == "game":
             roles[pid] = "crew"
+            join_role_room(request.sid, "crew")
             socketio.emit(
                 "role",
                 {"role": "crew", "word": current_word},
@@ -414,16 +1568,7 @@ def join(data):
         
         # If in leaderboard state, rebuild it with updated name
         if state == "leaderboard":
-            global leaderboard
-            leaderboard = [
-                {
-                    "name": player_names.get(p_id, "Unknown"),
-                    "score": scores[p_id]
-                }
-                for p_id in scores
-                if p_id in player_names
-            ]
-            leaderboard.sort(key=lambda x: x["score"], reverse=True)
+            rebuild_leaderboard()
         
         request_state_sync()
         enforce_min_players_with_grace()
@@ -433,48 +1578,31 @@ def join(data):
         socketio.emit("join_result", {"success": False}, to=request.sid)
         return
 
+    if quick_play:
+        # Server-run rooms are filled from the queue only
+        socketio.emit("join_result", {"success": False, "reason": "Use Quick Play to join"}, to=request.sid)
+        return
+
     if not name:
         socketio.emit("join_result", {"success": False}, to=request.sid)
         return
 
-    # Check if name is already taken by another active player
-    for other_pid, player_data in players.items():
-        if other_pid != pid and player_data["name"] == name and player_data["sid"] is not None:
-            socketio.emit("join_result", {"success": False}, to=request.sid)
-            return
-
-    pid = str(uuid.uuid4())
-    players[pid] = {
-        "sid": request.sid,
-        "name": name
-    }
-    player_names[pid] = name  # Persist name for this session
-
-    socketio.emit("join_result", {
-        "success": True,
-        "playerId": pid,
-        "state": state,
-        "isHost": False
-    }, to=request.sid)
-
-    # If joining mid-game, force crew role
-    if state == "game":
-        roles[pid] = "crew"
-        socketio.emit(
-            "role",
-            {"role": "crew", "word": current_word},
-            to=request.sid
-        )
+    if is_name_taken(name, pid):
+        socketio.emit("join_result", {"success": False}, to=request.sid)
+        return
 
-    # Broadcast join message to all OTHER players
-    socketio.emit("player_joined", {"name": name}, skip_sid=request.sid)
+    if active_player_count() >= MAX_PLAYERS:
+        socketio.emit("join_result", {"success": False, "reason": "Game is full"}, to=request.sid)
+        return
 
+    add_player(request.sid, name)
     request_state_sync()
 
 
 @socketio.on("leave")
+@traced("on:leave")
 def leave(data=None):
-    global state, roles, votes, current_word
+    global state, roles, current_word
     
     data = data or {}
 
@@ -507,24 +1635,30 @@ def leave(data=None):
     # Notify the removed player if they are connected
     if player["sid"]:
         socketio.emit("leave_success", { "kicked": is_kicked }, to=player["sid"])
+        socketio.server.leave_room(player["sid"], CHAT_ROOM, namespace="/")
 
     # Remove votes involving this player
     votes.pop(target_pid, None)
-    votes = {
-        voter: voted
-        for voter, voted in votes.items()
-        if voted != target_pid
-    }
-    
-    # If impostor leaves during game state, broadcast and reset to lobby
-    if is_impostor and state == "game":
+    for voter in [voter for voter, voted in votes.items() if voted == target_pid]:
+        del votes[voter]
+    rebuild_tally()
+
+    impostors_remaining = len([
+        pid for pid in impostor_ids()
+        if pid != target_pid and players.get(pid, {}).get("sid") is not None
+    ])
+
+    # If the last impostor leaves during game state, broadcast and reset to lobby
+    forget_presence(target_pid)
+
+    if is_impostor and state == "game" and impostors_remaining == 0:
         # Remove from players dict since game must reset
         del players[target_pid]
         
         # Reset game state
         state = "lobby"
         roles.clear()
-        votes.clear()
+        clear_votes()
         current_word = None
         
         # Broadcast to all OTHER clients that impostor left
@@ -537,7 +1671,15 @@ def leave(data=None):
         players[target_pid]["sid"] = None
         
         # Broadcast appropriate message based on game state
-        if state == "game":
+        if is_impostor and state == "game":
+            # Other impostors are still playing, so the round carries on
+            roles.pop(target_pid, None)
+            socketio.emit("impostor_left", {
+                "name": player_name,
+                "kicked": is_kicked,
+                "impostorsRemaining": impostors_remaining
+            }, skip_sid=request.sid)
+        elif state == "game":
             socketio.emit("non_impostor_left", {"name": player_name, "kicked": is_kicked}, skip_sid=request.sid)
         else:
             socketio.emit("player_left", {"name": player_name, "kicked": is_kicked}, skip_sid=request.sid)
@@ -547,6 +1689,7 @@ def leave(data=None):
 
 
 @socketio.on("return_to_lobby")
+@traced("on:return_to_lobby")
 def return_to_lobby():
     # Only allow if game is currently showing leaderboard and cannot continue
     if state != "leaderboard":
@@ -560,14 +1703,14 @@ def return_to_lobby():
 
 
 @socketio.on("start_game")
+@traced("on:start_game")
 def start_game():
     new_game(True)
 
 
 @socketio.on("cast_vote")
+@traced("on:cast_vote")
 def cast_vote(data):
-    global votes
-
     if state != "voting":
         return
 
@@ -581,18 +1724,47 @@ def cast_vote(data):
     if voter_pid == voted_pid:
         return
 
+    if voted_pid not in players:
+        return
+
     # overwrite allowed
+    previous = votes.get(voter_pid)
+    if previous == voted_pid:
+        return
     votes[voter_pid] = voted_pid
-    emit_state()
+    if previous is not None:
+        vote_tally[previous] -= 1
+    vote_tally[voted_pid] = vote_tally.get(voted_pid, 0) + 1
+    schedule_state_emit()
 
 
 @socketio.on("reveal_results")
+@traced("on:reveal_results")
 def reveal_results():
-    global state, scores
-
     if request.sid != host_sid:
         return
 
+    score_round()
+
+
+@traced("rebuild_leaderboard")
+def rebuild_leaderboard():
+    # Build leaderboard data - include all players with scores, even if they left
+    global leaderboard
+    leaderboard = [
+        {
+            "name": player_names.get(pid, "Unknown"),
+            "score": scores[pid]
+        }
+        for pid in scores
+        if pid in player_names
+    ]
+    leaderboard.sort(key=lambda x: x["score"], reverse=True)
+
+
+def score_round(voting_closed=False):
+    global state, scores
+
     if state != "voting":
         return
 
@@ -602,74 +1774,62 @@ def reveal_results():
         if p["sid"] is not None
     ])
 
-    if len(votes) < required_votes:
+    # Once voting is closed, missing votes are simply not counted
+    if len(votes) < required_votes and not voting_closed:
         return
 
     result = compute_results()
+    if not result and voting_closed:
+        result = {"votedOut": [], "impostors": impostor_ids(), "correct": False}
     if not result:
         return
 
-    impostor_pid = result["impostor"]
-    voted_out_pid = result["votedOut"]
+    impostors = [pid for pid in result["impostors"] if pid in players]
+    voted_out = [pid for pid in result["votedOut"] if pid in players]
 
     # Initialize scores if needed
     for pid in players:
         if pid not in scores:
             scores[pid] = 0
 
-    # If impostor left the game, we can't score - abort reveal
-    if impostor_pid not in players:
+    # If every impostor left the game, we can't score - abort reveal
+    if not impostors:
         return
 
-    # Score the impostor: +1 for each incorrect vote FROM NON-IMPOSTORS
+    scores_before = dict(scores)
+
+    # One pass over the votes: crew get +1 for voting for any impostor,
+    # and every impostor gets +1 for each crew vote that missed
+    impostor_set = set(impostors)
     incorrect_votes = 0
+    num_correct = 0
     for voter_pid, voted_pid in votes.items():
         # Only count votes from players still in the game
         if voter_pid not in players:
             continue
-        if str(voter_pid) != str(impostor_pid) and str(voted_pid) != str(impostor_pid):
+        if voter_pid in impostor_set:
+            # ignore impostors' own votes for scoring
+            continue
+        if voted_pid in impostor_set:
+            scores[voter_pid] += 1
+            num_correct += 1
+        else:
             incorrect_votes += 1
-    scores[impostor_pid] += incorrect_votes
+    for pid in impostors:
+        scores[pid] += incorrect_votes
 
-    # Score the crew: +1 if they voted correctly (and they're not the impostor)
-    # Count correct votes from non-impostor players and award them
-    num_correct = 0
-    for voter_pid, voted_pid in votes.items():
-        try:
-            # Only process if voter still in game
-            if voter_pid not in players:
-                continue
-            if str(voter_pid) == str(impostor_pid):
-                # ignore impostor's own vote for scoring
-                continue
-            if str(voted_pid) == str(impostor_pid):
-                # only count if voter is a known player
-                if voter_pid in players:
-                    scores[voter_pid] += 1
-                    num_correct += 1
-        except Exception:
-            continue
+    rebuild_leaderboard()
 
-    # Build leaderboard data - include all players with scores, even if they left
-    global leaderboard
-    leaderboard = [
-        {
-            "name": player_names.get(pid, "Unknown"),
-            "score": scores[pid]
-        }
-        for pid in scores
-        if pid in player_names
-    ]
-    leaderboard.sort(key=lambda x: x["score"], reverse=True)
-
-    # Number of active non-impostor players (possible voters excluding impostor)
-    num_possible = max(0, active_player_count() - 1)  # -1 for the impostor
+    # Number of active non-impostor players (possible voters excluding impostors)
+    num_possible = max(0, active_player_count() - len(impostors))
 
     socketio.emit("round_result", {
-        "votedOut": players[voted_out_pid]["name"],
-        "votedOutId": voted_out_pid,
-        "impostor": players[impostor_pid]["name"],
-        "impostorId": impostor_pid,
+        "votedOut": ", ".join(players[pid]["name"] for pid in voted_out) or None,
+        "votedOutId": voted_out[0] if voted_out else None,
+        "votedOutIds": voted_out,
+        "impostor": ", ".join(players[pid]["name"] for pid in impostors),
+        "impostorId": impostors[0],
+        "impostorIds": impostors,
         "correct": result["correct"],
         "leaderboard": leaderboard,
         "numCorrect": num_correct,
@@ -679,8 +1839,11 @@ def reveal_results():
     state = "leaderboard"
     emit_state()
 
+    record_round(result, scores_before)
+
 
 @socketio.on("adjust_time")
+@traced("on:adjust_time")
 def adjust_time(data):
     global round_end_time, timer_paused, paused_remaining
     if request.sid != host_sid:
@@ -717,6 +1880,7 @@ def adjust_time(data):
 
 
 @socketio.on("toggle_pause")
+@traced("on:toggle_pause")
 def toggle_pause():
     global timer_paused, paused_remaining, round_end_time
     if request.sid != host_sid:
@@ -742,6 +1906,7 @@ def toggle_pause():
 
 
 @socketio.on("set_round_minutes")
+@traced("on:set_round_minutes")
 def set_round_minutes(data):
     global round_minutes
     if request.sid != host_sid:
@@ -755,6 +1920,7 @@ def set_round_minutes(data):
 
 
 @socketio.on("set_round_seconds")
+@traced("on:set_round_seconds")
 def set_round_seconds(data):
     global round_length_seconds, round_minutes
     if request.sid != host_sid:
@@ -770,32 +1936,150 @@ def set_round_seconds(data):
     emit_state()
 
 
+@socketio.on("set_impostors")
+@traced("on:set_impostors")
+def set_impostors(data):
+    global num_impostors
+    if request.sid != host_sid:
+        return
+    try:
+        count = int(data.get("count", 1))
+    except Exception:
+        return
+    # Upper bound is applied per round once the player count is known
+    num_impostors = max(1, min(MAX_PLAYERS // 2, count))
+    emit_state()
+
+
+@socketio.on("set_tie_rule")
+@traced("on:set_tie_rule")
+def set_tie_rule(data):
+    global tie_rule
+    if request.sid != host_sid:
+        return
+    rule = data.get("rule")
+    if rule not in TIE_RULES:
+        return
+    tie_rule = rule
+    emit_state()
+
+
 @socketio.on("end_session")
+@traced("on:end_session")
 def end_session():
-    global players, player_names, host_token, host_sid, state, roles, round_minutes, current_word, scores, leaderboard
     if request.sid == host_sid:
-        players.clear()
-        player_names.clear()
-        votes.clear()
-        host_token = None
-        host_sid = None
-        state = "waiting"
-        roles.clear()
-        round_minutes = DEFAULT_DURATION
-        current_word = None
-        scores.clear()
-        leaderboard = []
-        request_state_sync()
+        close_session()
+
+
+def close_session():
+    global players, player_names, host_token, host_sid, state, roles, round_minutes, current_word, scores, leaderboard
+    global quick_play, quick_play_phase, num_impostors, tie_rule
+    players.clear()
+    player_names.clear()
+    clear_votes()
+    host_token = None
+    host_sid = None
+    state = "waiting"
+    quick_play = False
+    quick_play_phase = (None, None)
+    roles.clear()
+    round_minutes = DEFAULT_DURATION
+    num_impostors = 1
+    tie_rule = "random"
+    current_word = None
+    scores.clear()
+    leaderboard = []
+    clear_chat()
+    clear_presence()
+    request_state_sync()
+
+
+@socketio.on("send_chat")
+@traced("on:send_chat")
+def send_chat(data):
+    global chat_flush_scheduled
+
+    pid = get_player_by_sid(request.sid)
+    if pid is None:
+        return
+
+    text = str((data or {}).get("text", "")).strip()[:CHAT_MAX_LENGTH]
+    if not text:
+        return
+
+    now = time.time()
+    retry_after = None
+    start_flush = False
+    with chat_lock:
+        # Sliding window rate limit per sender
+        sent = chat_send_times.setdefault(pid, deque())
+        while sent and now - sent[0] >= CHAT_RATE_WINDOW_SECONDS:
+            sent.popleft()
+
+        if len(sent) >= CHAT_RATE_LIMIT:
+            retry_after = max(0, int(sent[0] + CHAT_RATE_WINDOW_SECONDS - now) + 1)
+        else:
+            sent.append(now)
+            message = {
+                "playerId": pid,
+                "name": players[pid]["name"],
+                "text": text,
+                "time": now
+            }
+            chat_history.append(message)
+            chat_pending.append(message)
+            if not chat_flush_scheduled:
+                chat_flush_scheduled = True
+                start_flush = True
+
+    if retry_after is not None:
+        socketio.emit("chat_rate_limited", {"retryAfter": retry_after}, to=request.sid)
+        return
+
+    if start_flush:
+        socketio.start_background_task(flush_chat)
+
+
+@socketio.on("quick_play")
+@traced("on:quick_play")
+def join_quick_play(data):
+    global matchmaker_running
+
+    name = str((data or {}).get("name", "")).strip()
+    if not name or get_player_by_sid(request.sid) is not None:
+        socketio.emit("quick_play_result", {"success": False}, to=request.sid)
+        return
+
+    with queue_lock:
+        if request.sid in queued_sids:
+            return
+        entry = {"sid": request.sid, "name": name, "queuedAt": time.time(), "cancelled": False}
+        play_queue.append(entry)
+        queued_sids[request.sid] = entry
+        position = len(queued_sids)
+        start_matchmaker = not matchmaker_running
+        matchmaker_running = True
+
+    socketio.emit("quick_play_result", {"success": True, "position": position}, to=request.sid)
+
+    if start_matchmaker:
+        socketio.start_background_task(run_matchmaker)
+
+
+@socketio.on("leave_queue")
+@traced("on:leave_queue")
+def leave_queue():
+    if dequeue(request.sid):
+        socketio.emit("queue_left", {}, to=request.sid)
 
 
 @socketio.on("next_round")
+@traced("on:next_round")
 def next_round():
     new_game(False)
 
 
 def new_game(is_initial):
-    global state, roles, current_word, timer_thread
-
     if request.sid != host_sid:
         return
     
@@ -810,8 +2094,20 @@ def new_game(is_initial):
         if state not in ("lobby", "leaderboard"):
             return
 
-    votes.clear()
+    begin_round(is_initial)
+
+
+def begin_round(is_initial):
+    global state, roles, current_word, timer_thread
+    global round_started_at, voting_started_at
+
+    if draining:
+        return  # no new rounds once this server is shutting down
+
+    clear_votes()
     state = "game"
+    round_started_at = time.time()
+    voting_started_at = None
 
     timer_thread = threading.Thread(target=start_round_timer, daemon=True)
     timer_thread.start()
@@ -819,37 +2115,49 @@ def new_game(is_initial):
     roles = {}
     current_word = get_random_word()
 
-    # Only pick impostor from active players (sid is not None)
+    # Only pick impostors from active players (sid is not None),
+    # always leaving the crew in the majority
     active_pids = active_player_ids()
     if not active_pids:
         return
-    impostor_pid = random.choice(active_pids)
+    impostor_count = max(1, min(num_impostors, (len(active_pids) - 1) // 2))
+    impostor_pids = set(random.sample(active_pids, impostor_count))
 
     for pid in players:
-        roles[pid] = "impostor" if pid == impostor_pid else "crew"
+        roles[pid] = "impostor" if pid in impostor_pids else "crew"
 
     if not is_initial:
         # Emit signal that next round has started
         socketio.emit("next_round_started", {})
 
-    for pid, role in roles.items():
-        sid = players[pid]["sid"]
-        if sid:
-            if role == "impostor":
-                socketio.emit("role", {"role": "impostor"}, to=sid)
-            else:
-                socketio.emit("role", {"role": "crew", "word": current_word}, to=sid)
+    # One emit per role instead of one per player
+    assign_role_rooms()
+    socketio.emit("role", {"role": "impostor", "impostorCount": impostor_count}, to=ROLE_ROOMS["impostor"])
+    socketio.emit("role", {"role": "crew", "word": current_word}, to=ROLE_ROOMS["crew"])
     
     emit_state()
 
 
-@socketio.on("request_state_sync")
 def request_state_sync():
     emit_state()
     emit_players()
 
 
+@socketio.on("request_state_sync")
+@traced("on:request_state_sync")
+def sync_client():
+    # Only the asking client needs a refresh
+    emit_state(to=request.sid)
+    send_players(request.sid)
+
+
+build_static()
+socketio.start_background_task(run_presence)
+if RESTORE_ON_START:
+    restore_migration()
+
+
 if __name__ == "__main__":
-    # TODO: add chat feature
     # TODO: add CSS
+    signal.signal(signal.SIGTERM, lambda signum, frame: begin_drain())
     socketio.run(app, host="0.0.0.0", port=5001)
\ No newline at end of file
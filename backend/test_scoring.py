@@ -0,0 +1,147 @@
+import os
+import tempfile
+
+import pytest
+
+# Keep the history writer away from the real database
+os.environ.setdefault("HISTORY_DB", os.path.join(tempfile.mkdtemp(), "history.db"))
+
+import app as game  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_game(monkeypatch):
+    for table in (game.players, game.player_names, game.roles, game.votes, game.vote_tally, game.scores):
+        table.clear()
+    monkeypatch.setattr(game, "state", "voting")
+    monkeypatch.setattr(game, "tie_rule", "random")
+    monkeypatch.setattr(game, "quick_play", False)
+    yield
+    for table in (game.players, game.player_names, game.roles, game.votes, game.vote_tally, game.scores):
+        table.clear()
+
+
+def seat(*names, impostors=()):
+    # Connected players with roles; the sid is a placeholder no socket owns
+    for name in names:
+        game.players[name] = {"sid": f"sid-{name}", "name": name}
+        game.player_names[name] = name
+        game.roles[name] = "impostor" if name in impostors else "crew"
+
+
+def vote(voter, voted):
+    game.votes[voter] = voted
+    game.rebuild_tally()
+
+
+def test_single_leader_is_voted_out():
+    seat("a", "b", "c", "d", impostors=("d",))
+    vote("a", "d")
+    vote("b", "d")
+    vote("c", "a")
+
+    result = game.compute_results()
+
+    assert result == {"votedOut": ["d"], "impostors": ["d"], "correct": True}
+
+
+def test_no_votes_gives_no_result():
+    seat("a", "b", "c", impostors=("c",))
+
+    assert game.compute_results() is None
+
+
+@pytest.mark.parametrize("rule, voted_out", [
+    ("all", [["a", "b"]]),
+    ("none", [[]]),
+    ("random", [["a"], ["b"]]),
+])
+def test_tie_rules(monkeypatch, rule, voted_out):
+    monkeypatch.setattr(game, "tie_rule", rule)
+    seat("a", "b", "c", "d", impostors=("b",))
+    vote("a", "b")
+    vote("b", "a")
+    vote("c", "a")
+    vote("d", "b")
+
+    result = game.compute_results()
+
+    assert sorted(result["votedOut"]) in voted_out
+    assert result["correct"] == ("b" in result["votedOut"])
+
+
+def test_changed_vote_moves_the_tally():
+    client = game.socketio.test_client(game.app)
+    seat("b", "c", impostors=("c",))
+    game.players["a"] = {"sid": None, "name": "a"}
+    game.roles["a"] = "crew"
+    try:
+        # Attach "a" to the test client's socket so cast_vote sees it as the voter
+        game.players["a"]["sid"] = game.socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/")
+
+        client.emit("cast_vote", {"voted": "b"})
+        assert game.vote_tally == {"b": 1}
+
+        client.emit("cast_vote", {"voted": "c"})
+        assert game.votes == {"a": "c"}
+        assert game.vote_tally == {"b": 0, "c": 1}
+        assert game.compute_results()["votedOut"] == ["c"]
+
+        # Voting for yourself is ignored and keeps the old vote
+        client.emit("cast_vote", {"voted": "a"})
+        assert game.votes == {"a": "c"}
+    finally:
+        client.disconnect()
+
+
+def test_rebuild_tally_after_a_vote_is_removed():
+    seat("a", "b", "c", impostors=("c",))
+    vote("a", "c")
+    vote("b", "c")
+    del game.votes["b"]
+    game.rebuild_tally()
+
+    assert game.vote_tally == {"c": 1}
+
+
+def test_scoring_with_two_impostors():
+    seat("a", "b", "c", "d", "e", impostors=("d", "e"))
+    vote("a", "d")   # crew, correct
+    vote("b", "e")   # crew, correct
+    vote("c", "a")   # crew, missed
+    vote("d", "a")   # impostor votes don't score
+    vote("e", "a")
+
+    game.score_round()
+
+    assert game.state == "leaderboard"
+    assert game.scores == {"a": 1, "b": 1, "c": 0, "d": 1, "e": 1}
+
+
+def test_round_waits_for_every_active_vote():
+    seat("a", "b", "c", impostors=("c",))
+    vote("a", "c")
+
+    game.score_round()
+
+    assert game.state == "voting"
+    assert game.scores == {}
+
+
+def test_closed_vote_scores_the_votes_that_are_in():
+    seat("a", "b", "c", "d", impostors=("d",))
+    vote("a", "d")
+
+    game.score_round(voting_closed=True)
+
+    assert game.state == "leaderboard"
+    assert game.scores == {"a": 1, "b": 0, "c": 0, "d": 0}
+
+
+def test_closed_vote_with_no_votes_still_scores():
+    seat("a", "b", "c", impostors=("c",))
+
+    game.score_round(voting_closed=True)
+
+    assert game.state == "leaderboard"
+    assert game.scores == {"a": 0, "b": 0, "c": 0}
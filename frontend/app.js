@@ -0,0 +1,755 @@
+let lastPlayers = [];
+let roster = new Map();  // player_id -> name, kept current by players_update/players_delta
+let impostorCount = 1;
+const VOTE_PAGE_SIZE = 20;
+let votePage = 0;
+let myVote = null;
+let lastState = null;
+let currentState = null;
+let showingResults = false;  // Track if results are being displayed
+
+// When the backend serves this page, connect back to wherever it came from.
+// A standalone copy falls back to the known backends.
+const SERVED_BY_BACKEND = document.currentScript?.dataset.backend === "self";
+// A draining server may point this tab at its replacement
+const BACKEND_URL = sessionStorage.getItem("backendUrl") || (
+    SERVED_BY_BACKEND ? location.origin :
+    location.hostname === "localhost" ? "http://localhost:5001" :
+    "https://imposter-backend-ch3h.onrender.com");
+
+let hostToken = localStorage.getItem("hostToken");
+// Respect a suppress flag so "Leave" can prevent immediate auto-rejoin on reload
+let suppressAutoJoin = localStorage.getItem("suppressAutoJoin");
+let storedPlayerId = localStorage.getItem("playerId");
+let playerId = storedPlayerId;
+
+// Build query params conditionally
+let query = { token: hostToken };
+if (!suppressAutoJoin && storedPlayerId) {
+    query.playerId = storedPlayerId;
+}
+if (suppressAutoJoin) {
+    // Clear the flag so next full reload will allow auto-join
+    localStorage.removeItem("suppressAutoJoin");
+}
+
+const socket = io(BACKEND_URL, {
+    query: query
+});
+
+let isHost = false;
+let hasJoined = false;
+
+socket.on("identity_update", data => {
+    if (data.playerId) {
+        playerId = data.playerId;
+        localStorage.setItem("playerId", data.playerId);
+    }
+
+    isHost = data.isHost;
+    hasJoined = data.hasJoined;
+
+    if (hasJoined) {
+        document.getElementById("joinArea").style.display = "none";
+    }
+    document.getElementById("chatArea").style.display = hasJoined ? "block" : "none";
+    socket.emit("request_state_sync");
+});
+
+function renderPlayers(players) {
+    // Ensure host's playerId is always available immediately after joining
+    playerId = localStorage.getItem("playerId") || playerId;
+    const ul = document.getElementById("players");
+    ul.innerHTML = "";
+    players.forEach(p => {
+        const li = document.createElement("li");
+        li.textContent = p.name;
+        ul.appendChild(li);
+    });
+
+    // Host-only player management list
+    const manageList = document.getElementById("playerManagementList");
+    manageList.innerHTML = "";
+
+    if (!isHost) return;
+
+    players.forEach(p => {
+        // Host should not be able to remove themselves
+        if (String(p.player_id) === String(playerId)) return;
+
+        const li = document.createElement("li");
+        li.style.marginBottom = "6px";
+
+        const nameSpan = document.createElement("span");
+        nameSpan.textContent = p.name;
+        nameSpan.style.marginRight = "10px";
+
+        const btn = document.createElement("button");
+        btn.textContent = "Remove";
+        btn.onclick = () => {
+            kickPlayer(p.player_id, p.name);
+        };
+
+        li.appendChild(nameSpan);
+        li.appendChild(btn);
+        manageList.appendChild(li);
+    });
+}
+
+function renderVoting(players) {
+    const list = document.getElementById("voteList");
+    list.innerHTML = "";
+
+    // Always get playerId from localStorage (most reliable source)
+    playerId = localStorage.getItem("playerId") || playerId;
+
+    if (!playerId) {
+        return;
+    }
+
+    // Strict string comparison to filter out current player
+    const filter = document.getElementById("voteFilter").value.trim().toLowerCase();
+    const candidates = players.filter(p =>
+        String(p.player_id) !== String(playerId) &&
+        (!filter || p.name.toLowerCase().includes(filter))
+    );
+
+    // Large games only render one page of vote buttons at a time
+    const pages = Math.max(1, Math.ceil(candidates.length / VOTE_PAGE_SIZE));
+    votePage = Math.min(votePage, pages - 1);
+    document.getElementById("votePager").style.display = pages > 1 ? "block" : "none";
+    document.getElementById("votePage").textContent = `${votePage + 1} / ${pages}`;
+
+    candidates.slice(votePage * VOTE_PAGE_SIZE, (votePage + 1) * VOTE_PAGE_SIZE).forEach(p => {
+
+        const label = document.createElement("label");
+        const radio = document.createElement("input");
+        radio.type = "radio";
+        radio.name = "vote";
+        radio.value = p.player_id;
+
+        if (myVote === p.player_id) {
+            radio.checked = true;
+        }
+
+        radio.onchange = () => {
+            myVote = p.player_id;
+            socket.emit("cast_vote", { voted: p.player_id });
+        };
+
+        label.appendChild(radio);
+        label.appendChild(document.createTextNode(" " + p.name));
+        list.appendChild(label);
+        list.appendChild(document.createElement("br"));
+    });
+}
+
+function hostLogin() {
+    socket.emit("host_login", { password: document.getElementById("hostPass").value });
+}
+
+function quickPlay() {
+    const name = document.getElementById("quickPlayName").value.trim();
+    if (!name) return;
+    socket.emit("quick_play", { name });
+}
+
+function leaveQueue() {
+    socket.emit("leave_queue");
+}
+
+function showQueued(queued, text) {
+    document.getElementById("quickPlayBtn").style.display = queued ? "none" : "inline";
+    document.getElementById("leaveQueueBtn").style.display = queued ? "inline" : "none";
+    document.getElementById("quickPlayStatus").textContent = text;
+}
+
+function join() {
+    if (hasJoined) {
+        // is this called if they have joined before, and we are merging the data
+        return;
+    }
+
+    const name = document.getElementById("name").value.trim();
+    if (!name) return;
+
+    // Check if name already exists
+    if (lastPlayers.some(p => p.name.toLowerCase() === name.toLowerCase())) {
+        alert("This name is already taken!");
+        return;
+    }
+
+    // Send the stored playerId (if any) so rejoining merges with previous data
+    const pidToSend = localStorage.getItem("playerId");
+    socket.emit("join", { name, playerId: pidToSend });
+}
+
+function leave() {
+    if (currentState === "voting") {
+        alert("Cannot leave during voting. Wait for results.");
+        return;
+    }
+
+    if (!confirm("Are you sure you want to leave?")) {
+        return;
+    }
+
+    // Keep playerId in localStorage so they can rejoin and merge scores
+    // Only remove hostToken and set a flag to suppress auto-rejoin on reload
+    localStorage.removeItem("hostToken");
+    localStorage.setItem("suppressAutoJoin", "1");
+    hasJoined = false;
+    socket.emit("leave");
+}
+
+const CHAT_HISTORY_SIZE = 50;
+function sendChat() {
+    const input = document.getElementById("chatInput");
+    const text = input.value.trim();
+    if (!text) return;
+    socket.emit("send_chat", { text });
+    input.value = "";
+}
+
+function renderChatMessages(messages) {
+    const list = document.getElementById("chatMessages");
+    messages.forEach(m => {
+        const li = document.createElement("li");
+        const nameB = document.createElement("b");
+        nameB.textContent = m.name + ": ";
+        li.appendChild(nameB);
+        li.appendChild(document.createTextNode(m.text));
+        list.appendChild(li);
+    });
+    // Keep the DOM bounded the same way the server history is
+    while (list.children.length > CHAT_HISTORY_SIZE) {
+        list.removeChild(list.firstChild);
+    }
+    list.scrollTop = list.scrollHeight;
+}
+
+function changeImpostors(delta) {
+    socket.emit("set_impostors", { count: impostorCount + delta });
+}
+
+function setTieRule(rule) {
+    socket.emit("set_tie_rule", { rule });
+}
+
+function returnToLobby() {
+    socket.emit("return_to_lobby");
+}
+
+function kickPlayer(playerId, playerName) {
+    if (currentState === "voting") {
+        alert("Cannot remove players during voting.");
+        return;
+    }
+
+    if (!confirm(`Remove ${playerName} from the game?`)) {
+        return;
+    }
+
+    socket.emit("leave", { playerId });
+}
+
+const MIN_PLAYERS = 3;
+function startGame() {
+    if (!hasJoined) {
+        alert("Host must join the game first");
+        return;
+    }
+    // lastPlayers contains only active players
+    if (lastPlayers.length < MIN_PLAYERS) {
+        alert(`Need at least ${MIN_PLAYERS} players to start the game.`);
+        return;
+    }
+    socket.emit("start_game");
+}
+
+function updateMinutes() {
+    const mins = parseInt(document.getElementById("roundMinutes")?.value || 3);
+    socket.emit("set_round_minutes", { minutes: mins });
+}
+
+function setRoundSeconds(seconds) {
+    socket.emit("set_round_seconds", { seconds });
+}
+
+function adjustGameTime(deltaSec) {
+    socket.emit("adjust_time", { delta: deltaSec });
+}
+
+function togglePause() {
+    socket.emit("toggle_pause");
+}
+
+function revealResults() {
+    socket.emit("reveal_results");
+}
+
+function nextRound() {
+    socket.emit("next_round");
+}
+
+function confirmEndSession() {
+    if (confirm("End the session? Everyone will be sad!")) {
+        socket.emit("end_session");
+    }
+}
+
+function renderLeaderboard(leaderboard) {
+    const leaderboardTable = document.getElementById("leaderboardTable");
+    // const rows = leaderboardTable.querySelectorAll("tr");
+    // rows.forEach((row, idx) => {
+    //     if (idx > 0) row.remove(); // Remove old rows
+    // });
+    leaderboardTable.querySelectorAll("tr:not(:first-child)").forEach(row => row.remove());
+
+    leaderboard.forEach((player, idx) => {
+        const tr = document.createElement("tr");
+        tr.style.borderBottom = "1px solid #ccc";
+
+        const rankTd = document.createElement("td");
+        rankTd.textContent = idx + 1;
+        rankTd.style.padding = "10px";
+
+        const nameTd = document.createElement("td");
+        nameTd.textContent = player.name;
+        nameTd.style.padding = "10px";
+
+        const scoreTd = document.createElement("td");
+        scoreTd.textContent = player.score;
+        scoreTd.style.padding = "10px";
+        scoreTd.style.textAlign = "right";
+
+        tr.appendChild(rankTd);
+        tr.appendChild(nameTd);
+        tr.appendChild(scoreTd);
+        leaderboardTable.appendChild(tr);
+    });
+}
+
+socket.on("host_login_result", data => {
+    if (!data.success) return alert("Host login failed");
+
+    localStorage.setItem("hostToken", data.token);
+    location.reload();
+});
+
+socket.on("quick_play_result", data => {
+    if (!data.success) return alert("Couldn't join quick play");
+    showQueued(true, `Searching for a game... (${data.position} in queue)`);
+});
+
+socket.on("queue_left", data => {
+    showQueued(false, "");
+});
+
+socket.on("join_result", data => {
+    if (!data.success) return;
+    showQueued(false, "");
+
+    hasJoined = true;
+    localStorage.setItem("playerId", data.playerId);
+
+    document.getElementById("name").value = "";
+    document.getElementById("joinArea").style.display = "none";
+    document.getElementById("chatArea").style.display = "block";
+    // Only update topRight to show Leave button if NOT host
+    if (!isHost) {
+        const top = document.getElementById("topRight");
+        top.innerHTML = "<button onclick='leave()'>Leave</button>";
+    }
+
+    // Host re-joining after reset must re-show Start Game
+    if (isHost) {
+        document.getElementById("startGame").style.display = "block";
+    }
+
+    socket.emit("request_state_sync");
+});
+
+socket.on("state_update", data => {
+    currentState = data.state;
+
+    if (!data.hostExists) {
+        localStorage.removeItem("playerId");
+        localStorage.removeItem("hostToken");
+        hasJoined = false;
+        showingResults = false;
+        // Clear players list
+        document.getElementById("players").innerHTML = "";
+        // Hide start game button
+        document.getElementById("startGame").style.display = "none";
+        // Clear topRight explicitly when no host exists
+        document.getElementById("topRight").innerHTML = "";
+        // Chat belongs to the session
+        document.getElementById("chatArea").style.display = "none";
+        document.getElementById("chatMessages").innerHTML = "";
+    }
+
+    // Don't override display if showing results
+    if (showingResults) {
+        return;
+    }
+
+    const hostLogin = document.getElementById("hostLogin");
+    const joinArea = document.getElementById("joinArea");
+    const startBtn = document.getElementById("startGame");
+    const title = document.getElementById("title");
+    const top = document.getElementById("topRight");
+    const timer = document.getElementById("timer");
+    const roundBox = document.getElementById("roundSettings");
+    const playerManage = document.getElementById("playerManagement");
+
+    title.textContent =
+        data.state === "waiting" ? "Waiting for host..." :
+        data.state === "lobby" ? (data.quickPlay ? "Quick Play Lobby" : "Lobby") :
+        data.state === "game" ? "Game Started" :
+        data.state === "voting" ? "Vote" :
+        data.state === "leaderboard" ? "Leaderboard" :
+        "Vote";
+
+    // Host login
+    hostLogin.style.display =
+        data.hostExists ? "none" : "block";
+    // Quick play is offered until a hosted session exists; a quick play room
+    // keeps it up for everyone still queueing or about to
+    document.getElementById("quickPlayArea").style.display =
+        !data.hostExists || (data.quickPlay && !hasJoined) ? "block" : "none";
+
+    // Name entry:
+    // - visible for ALL clients once a host exists
+    // - hidden after that client has joined, and in quick play (the queue places players)
+    if (data.hostExists && !data.quickPlay && !hasJoined) {
+        joinArea.style.display = "block";
+    } else {
+        joinArea.style.display = "none";
+    }
+
+    // Update round length display (seconds)
+    const roundLen = data.roundLengthSeconds !== undefined ? data.roundLengthSeconds : (data.roundMinutes ? data.roundMinutes * 60 : 180);
+    const mins = Math.floor(roundLen / 60);
+    const secs = String(roundLen % 60).padStart(2, '0');
+    document.getElementById("roundLengthDisplay").textContent = `${mins}:${secs}`;
+
+    if (data.impostors !== undefined) {
+        impostorCount = data.impostors;
+        document.getElementById("impostorCountDisplay").textContent = impostorCount;
+    }
+    if (data.tieRule) {
+        document.getElementById("tieRule").value = data.tieRule;
+    }
+
+    roundBox.style.display =
+        (isHost && hasJoined && (data.state === "lobby" || data.state === "leaderboard")) ? "block" : "none";
+
+    playerManage.style.display = isHost ? "block" : "none";
+
+    startBtn.style.display =
+        (isHost && hasJoined && data.state === "lobby") ? "block" : "none";
+
+    const nextRoundBtn = document.getElementById("nextRoundBtn");
+
+    // Top-right controls
+    if (data.hostExists) {
+        top.innerHTML = "";
+        if (isHost) {
+            top.innerHTML = "<b>Host</b> <button onclick='confirmEndSession()'>End Session</button>";
+            // Add game controls only during game state
+            if (data.state === "game") {
+                const controls = document.createElement('div');
+                controls.style.display = 'inline-block';
+                controls.style.marginLeft = '10px';
+                controls.innerHTML = '<button id="decrease30">-30s</button> <button id="pauseBtn">Pause</button> <button id="increase30">+30s</button>';
+                top.appendChild(controls);
+                document.getElementById('decrease30').onclick = () => adjustGameTime(-30);
+                document.getElementById('increase30').onclick = () => adjustGameTime(30);
+                document.getElementById('pauseBtn').onclick = () => togglePause();
+            }
+            if (data.state === "leaderboard") {
+                nextRoundBtn.style.display = data.canContinue ? "block" : "none";
+            }
+        } else if (hasJoined) {
+            if (data.state === "leaderboard") {
+                if (!data.canContinue) {
+                    top.innerHTML = "<button onclick='returnToLobby()'>Return to Lobby</button>";
+                } else {
+                    top.innerHTML = "<button onclick='leave()'>Leave</button>";
+                }
+            } else {
+                top.innerHTML = "<button onclick='leave()'>Leave</button>";
+            }
+        }
+    }
+
+    if (data.state === "game") {
+        timer.style.display = "block";
+        if (data.timeRemaining !== null && data.timeRemaining !== undefined) {
+            const mins = Math.floor(data.timeRemaining / 60);
+            const secs = String(data.timeRemaining % 60).padStart(2, "0");
+            timer.textContent = `${mins}:${secs}`;
+        }
+        // Update pause button text if present
+        const pauseBtn = document.getElementById("pauseBtn");
+        if (pauseBtn) {
+            pauseBtn.textContent = data.timerPaused ? "Play" : "Pause";
+        }
+    } else {
+        timer.style.display = "none";
+    }
+
+    const votingArea = document.getElementById("votingArea");
+    const remaining = document.getElementById("remainingVotes");
+    const playersList = document.getElementById("players");
+    const leaderboardArea = document.getElementById("leaderboardArea");
+    const revealBtn = document.getElementById("revealBtn");
+
+    // If player left mid-game/voting, show rejoin area instead of voting UI
+    if (!hasJoined && (data.state === "game" || data.state === "voting")) {
+        votingArea.style.display = "none";
+        playersList.style.display = "block";
+        leaderboardArea.style.display = "none";
+        joinArea.style.display = "block";
+    } else if (data.state === "leaderboard") {
+        leaderboardArea.style.display = "block";
+        votingArea.style.display = "none";
+        playersList.style.display = "none";
+        revealBtn.style.display = "none";
+        document.getElementById("startGame").style.display = "none";
+
+        // Populate leaderboard table if data provided
+        if (data.leaderboard && data.leaderboard.length > 0) {
+            renderLeaderboard(data.leaderboard)
+        }
+
+        if (isHost) {
+            nextRoundBtn.style.display = data.canContinue ? "block" : "none";
+        }
+    } else if (data.state === "voting") {
+        if (currentState !== "voting") {
+            myVote = null;
+        }
+
+        votingArea.style.display = "block";
+        playersList.style.display = "none";
+        leaderboardArea.style.display = "none";
+        nextRoundBtn.style.display = "none";
+
+        remaining.textContent =
+            data.remainingVotes > 0
+            ? `Waiting for ${data.remainingVotes} players to vote...`
+            : "All votes are in. Waiting for host.";
+
+        // Render voting list - ensure it renders when state transitions to voting
+        if (lastPlayers.length > 0) {
+            renderVoting(lastPlayers);
+        } else if (!playerId) {
+            // If playerId not yet set, request state sync to get it
+            socket.emit("request_state_sync");
+        }
+    } else {
+        votingArea.style.display = "none";
+        playersList.style.display = "block";
+        leaderboardArea.style.display = "none";
+        nextRoundBtn.style.display = "none";
+    }
+
+    if (data.state === "voting" && isHost && data.remainingVotes === 0) {
+        revealBtn.style.display = "block";
+    } else {
+        revealBtn.style.display = "none";
+    }
+});
+
+function applyRoster() {
+    lastPlayers = Array.from(roster, ([player_id, name]) => ({ player_id, name }));
+    renderPlayers(lastPlayers);
+
+    // Always re-render voting list when players update during voting
+    if (currentState === "voting" && playerId) {
+        renderVoting(lastPlayers);
+    }
+}
+
+socket.on("players_update", data => {
+    roster = new Map(data.players.map(p => [p.player_id, p.name]));
+    applyRoster();
+});
+
+socket.on("players_delta", data => {
+    data.removed.forEach(pid => roster.delete(pid));
+    data.added.forEach(p => roster.set(p.player_id, p.name));
+    applyRoster();
+});
+
+document.getElementById("voteFilter").oninput = () => {
+    votePage = 0;
+    renderVoting(lastPlayers);
+};
+document.getElementById("votePrev").onclick = () => {
+    votePage = Math.max(0, votePage - 1);
+    renderVoting(lastPlayers);
+};
+document.getElementById("voteNext").onclick = () => {
+    votePage += 1;
+    renderVoting(lastPlayers);
+};
+
+// default round length +/- buttons (in lobby/leaderboard)
+document.getElementById('decreaseDefault30').onclick = () => {
+    const currentLen = parseInt(document.getElementById("roundLengthDisplay").textContent.split(':')[0]) * 60 
+                     + parseInt(document.getElementById("roundLengthDisplay").textContent.split(':')[1]);
+    const newLen = Math.max(60, Math.min(5 * 60, currentLen - 30));
+    socket.emit('set_round_seconds', { seconds: newLen });
+};
+
+document.getElementById('increaseDefault30').onclick = () => {
+    const currentLen = parseInt(document.getElementById("roundLengthDisplay").textContent.split(':')[0]) * 60 
+                     + parseInt(document.getElementById("roundLengthDisplay").textContent.split(':')[1]);
+    const newLen = Math.max(60, Math.min(5 * 60, currentLen + 30));
+    socket.emit('set_round_seconds', { seconds: newLen });
+};
+
+document.getElementById("chatInput").addEventListener("keydown", e => {
+    if (e.key === "Enter") sendChat();
+});
+
+socket.on("chat_history", data => {
+    document.getElementById("chatMessages").innerHTML = "";
+    renderChatMessages(data.messages || []);
+});
+
+socket.on("chat_messages", data => {
+    if (!hasJoined) return;
+    renderChatMessages(data.messages || []);
+});
+
+socket.on("chat_rate_limited", data => {
+    alert(`You're sending messages too fast. Try again in ${data.retryAfter}s.`);
+});
+
+socket.on("role", data => {
+    if (data.role === "impostor") {
+        alert(data.impostorCount > 1
+            ? `You are one of ${data.impostorCount} IMPOSTORS`
+            : "You are the IMPOSTOR");
+    } else {
+        alert(`The word is: ${data.word}`);
+    }
+});
+
+socket.on("round_result", data => {
+    const impostorName = data.impostor;
+    const myVoted = myVote;
+    const leaderboard = data.leaderboard || [];
+
+    const impostorIds = (data.impostorIds || [data.impostorId]).map(String);
+
+    // Find the name of who I voted for
+    const myVotedPlayer = lastPlayers.find(p => p.player_id === myVoted);
+    const myVotedName = myVotedPlayer ? myVotedPlayer.name : "Unknown";
+
+    // Use backend-provided counts for impostor messaging
+    const numCorrect = data.numCorrect !== undefined ? data.numCorrect : 0;
+    const numPossible = data.numPossible !== undefined ? data.numPossible : Math.max(0, lastPlayers.length - 1);
+    const isImpostor = impostorIds.includes(String(playerId));
+    const didVoteCorrect = impostorIds.includes(String(myVoted));
+    const impostorLabel = impostorIds.length > 1 ? "Impostors were" : "Impostor was";
+
+    if (isImpostor) {
+        alert(`${numCorrect}/${numPossible} players correctly guessed you.`);
+    } else if (!myVoted) {
+        alert(`You didn't vote.\n${impostorLabel} ${impostorName}.`);
+    } else if (didVoteCorrect) {
+        alert(`Correct! You voted for ${myVotedName}, who was an impostor.`);
+    } else {
+        alert(`Wrong! You voted for ${myVotedName}.\nThe ${impostorLabel.toLowerCase()} ${impostorName}.`);
+    }
+
+    // Display leaderboard
+    renderLeaderboard(leaderboard)
+
+    myVote = null;
+});
+
+socket.on("next_round_started", data => {
+    // Reset the results flag when new round starts
+    showingResults = false;
+});
+
+socket.on("leave_success", data => {
+    if (data?.kicked) {
+        // 🔑 Prevent auto-rejoin ONLY on the kicked client
+        localStorage.setItem("suppressAutoJoin", "1");
+    }
+
+    hasJoined = false;
+    alert(data?.kicked ? "You were removed from the game." : "You have left successfully");
+    location.reload();
+});
+
+socket.on("player_joined", data => {
+    alert(`${data.name} has joined`);
+});
+
+socket.on("impostor_left", data => {
+    if (!hasJoined) return;
+
+    if (data.impostorsRemaining > 0) {
+        const how = data.kicked ? "was removed by the host" : "left";
+        alert(`${data.name} ${how}. They were an impostor.\n\n${data.impostorsRemaining} impostor(s) still playing.`);
+        return;
+    }
+
+    if (data.kicked) {
+        alert(`${data.name} was REMOVED by the host.\n\nThey were the IMPOSTOR.\nGame returned to lobby.`);
+    } else {
+        alert(`${data.name} left the game.\n\nThey were the IMPOSTOR.\nGame returned to lobby.`);
+    }
+});
+
+socket.on("non_impostor_left", data => {
+    if (!hasJoined) return;
+
+    if (data.kicked) {
+        alert(`${data.name} was removed by the host.`);
+    } else {
+        alert(`${data.name} left. They weren't the impostor.`);
+    }
+});
+
+socket.on("player_left", data => {
+    if (!hasJoined) return;
+
+    if (data.kicked) {
+        alert(`${data.name} was removed by the host.`);
+    } else {
+        alert(`${data.name} has left.`);
+    }
+});
+
+socket.on("host_powerful", data => {
+    if (isHost) {
+        alert(`You can't kick yourself out!`);
+    }
+});
+
+socket.on("reconnect_hint", data => {
+    // The server is about to restart: don't all rush back the moment it drops
+    socket.io.reconnection(false);
+    if (data.url) {
+        sessionStorage.setItem("backendUrl", data.url);
+    }
+    const delay = 1000 + Math.random() * (data.spreadSeconds || 0) * 1000;
+    setTimeout(() => location.reload(), delay);
+});
+
+socket.on("game_ended", data => {
+    if (!hasJoined) return;
+    const reason = data && data.reason ? data.reason : "Game ended.";
+    alert(reason);
+    // request state sync to show lobby
+    socket.emit("request_state_sync");
+});